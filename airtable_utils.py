@@ -1,170 +1,451 @@
+import asyncio
+from contextlib import aclosing
 import httpx
+import orjson
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
+from dataclasses import dataclass, fields as dataclass_fields
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Final, List, Dict, Optional, Set, Tuple
+from urllib.parse import quote
 from dotenv import load_dotenv
 import logging
-from email_generator import GeminiEmailGenerator
+from email_generator import GEMINI_CONCURRENCY, GeminiEmailGenerator
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Airtable connection and pacing settings
+AIRTABLE_API_KEY: Final = os.getenv("AIRTABLE_API_KEY")
+AIRTABLE_BASE_ID: Final = os.getenv("AIRTABLE_BASE_ID")
+AIRTABLE_TABLE_NAME: Final = os.getenv("AIRTABLE_TABLE_NAME")
+# Airtable allows 5 requests per second per base and blocks for 30 seconds when exceeded
+AIRTABLE_RPS: Final = int(os.getenv("AIRTABLE_RPS", "4"))
+AIRTABLE_RATE_LIMIT_COOLDOWN: Final = 30
+# Upper bound on leads emailed per automation run; leads missing a name or email
+# do not count toward it. 0 processes every stale lead
+STALE_BATCH_SIZE: Final = int(os.getenv("STALE_BATCH_SIZE", "50")) or None
+
+# Leads that already have a generated email are excluded by Airtable itself.
+# 'Last Contacted' is still checked locally since it arrives in mixed
+# DD/MM/YYYY and YYYY-MM-DD formats that formula date functions can't parse.
+STALE_LEADS_FORMULA = "{Generated Text Message} = ''"
+
+# Airtable accepts at most 10 records per batch create/update request
+AIRTABLE_BATCH_SIZE = 10
+
+# Maps Lead attributes to their Airtable column names
+AIRTABLE_FIELDS = {
+    "full_name": "Full Name",
+    "email_address": "Email Address",
+    "phone_number": "Phone Number",
+    "potential_interest": "Potential Interest",
+    "crm_services_needed": "CRM Services Needed",
+    "lead_source": "Lead Source",
+    "status_in_sales_funnel": "Status in Sales Funnel",
+    "last_contacted": "Last Contacted",
+    "generated_email_message": "Generated Text Message",
+    "timestamp": "Timestamp",
+    "status": "Status",
+}
+
+# Airtable column names in Lead field order; used both as the fields[] projection,
+# so only normalized columns are requested, and to build leads positionally
+_FIELD_COLUMNS = tuple(AIRTABLE_FIELDS.values())
+
+@dataclass(slots=True)
+class Lead:
+    """A lead record normalized from Airtable"""
+    id: str
+    full_name: str = ""
+    email_address: str = ""
+    phone_number: str = ""
+    potential_interest: str = ""
+    crm_services_needed: str = ""
+    lead_source: str = ""
+    status_in_sales_funnel: str = ""
+    last_contacted: str = ""
+    generated_email_message: str = ""
+    timestamp: str = ""
+    status: str = ""
+
+# Keep the column mapping and the dataclass in lockstep; the order matters
+# because _lead_from_record passes the values positionally
+if list(AIRTABLE_FIELDS) != [f.name for f in dataclass_fields(Lead)][1:]:
+    raise RuntimeError("AIRTABLE_FIELDS does not match the fields of Lead")
+
+def _lead_from_record(record: Dict) -> Lead:
+    """Build a Lead from a raw Airtable record"""
+    values = record.get("fields", {})
+    return Lead(record["id"], *[values.get(column, "") for column in _FIELD_COLUMNS])
+
+def _parse_last_contacted(value: str) -> date:
+    """Parse a 'Last Contacted' value in DD/MM/YYYY or ISO YYYY-MM-DD form"""
+    if "/" in value:
+        # Airtable is giving you DD/MM/YYYY
+        day, month, year = value.split("/", 2)
+        return date(int(year), int(month), int(day))
+    # Fallback to ISO YYYY-MM-DD
+    return date.fromisoformat(value)
+
+def _is_processable(lead: Lead) -> bool:
+    """Whether an email can be generated for the lead; others are skipped as insufficient_data"""
+    return bool(lead.full_name and lead.email_address)
+
+class LeadNotFoundError(Exception):
+    """Raised when Airtable reports that a lead record does not exist"""
+
+def _is_rate_limited(exc: BaseException) -> bool:
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429
+
 class AirtableUtils:
     def __init__(self):
         """Initializes the Airtable client with API keys and table info."""
-        self.api_key = os.getenv("AIRTABLE_API_KEY")
-        self.base_id = os.getenv("AIRTABLE_BASE_ID")
-        self.table_name = os.getenv("AIRTABLE_TABLE_NAME")
+        self.api_key = AIRTABLE_API_KEY
+        self.base_id = AIRTABLE_BASE_ID
+        self.table_name = AIRTABLE_TABLE_NAME
         
         if not all([self.api_key, self.base_id, self.table_name]):
             raise ValueError("Missing Airtable configuration. Please set AIRTABLE_API_KEY, AIRTABLE_BASE_ID, and AIRTABLE_TABLE_NAME")
+
+        # Request paths are relative to the base; table names may contain spaces
+        self._table_path = quote(self.table_name, safe="")
+        # One long-lived client so every request reuses pooled keep-alive connections
+        self._client = httpx.AsyncClient(
+            base_url=f"https://api.airtable.com/v0/{self.base_id}/",
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
+        )
+        # Paces every Airtable call below the per-base request limit
+        self._limiter = AsyncLimiter(AIRTABLE_RPS, 1)
+        # Throttled (429) requests back off from Airtable's cooldown, built once per instance
+        self._retrying = AsyncRetrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential_jitter(multiplier=AIRTABLE_RATE_LIMIT_COOLDOWN, max=2 * AIRTABLE_RATE_LIMIT_COOLDOWN),
+            retry=retry_if_exception(_is_rate_limited),
+            before_sleep=lambda state: logging.warning(f"Airtable rate limit hit. Retrying in {state.next_action.sleep:.1f} seconds..."),
+            reraise=True
+        )
+        # Caps concurrently processed leads in batch runs; the Gemini calls themselves
+        # are bounded by the email generator for every caller
+        self._batch_sem = asyncio.Semaphore(GEMINI_CONCURRENCY)
+        # Short-lived read caches; invalidated whenever this process writes to the table
+        self._lead_cache = TTLCache(maxsize=1024, ttl=60)
+        self._stale_cache = TTLCache(maxsize=1, ttl=30)
+        self._stale_lock = asyncio.Lock()
+        # Bumped by every write so a read that overlapped one does not cache its result
+        self._write_generation = 0
+        # Held for the lifetime of this instance so its Gemini connections stay warm
+        self.email_generator = GeminiEmailGenerator()
+
+    async def aclose(self):
+        """Close the shared HTTP clients and release their pooled connections"""
+        await self._client.aclose()
+        await self.email_generator.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Send a request to Airtable through the shared rate limiter.
+        Throttled (429) responses are retried with backoff; other errors are raised.
+        """
+        # copy() gives each call its own attempt state from the shared policy
+        async for attempt in self._retrying.copy():
+            with attempt:
+                await self._limiter.acquire()
+                response = await self._client.request(method, path, **kwargs)
+                response.raise_for_status()
+                return response
     
     # ... (all other methods are unchanged, as they were already correctly implemented)
     
-    async def fetch_stale_leads(self) -> List[Dict]:
+    async def fetch_stale_leads(self, max_records: Optional[int] = None, fresh: bool = False) -> List[Lead]:
         """
-        Fetches all leads from Airtable and filters for "stale" leads.
+        Fetches leads without a generated email from Airtable and filters for "stale" leads.
         A lead is considered stale if 'Last Contacted' is more than 7 days ago.
+        When max_records is given, pagination stops once that many stale leads with a
+        name and email are found; incomplete leads seen on the way are still returned
+        but do not count toward the cap, so they cannot crowd out processable ones.
+        Results are served from a short TTL cache unless fresh is set.
         """
-        try:
-            async with httpx.AsyncClient() as client:
-                url = f"https://api.airtable.com/v0/{self.base_id}/{self.table_name}"
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                all_records = []
-                params = {}
-                while True:
-                    response = await client.get(url, headers=headers, params=params)
-                    response.raise_for_status()
-                    data = response.json()
-                    all_records.extend(data.get("records", []))
-                    offset = data.get("offset")
-                    if not offset:
-                        break
-                    params["offset"] = offset
-                
-                stale_leads = []
-                today = datetime.now().date()
-                stale_threshold = timedelta(days=7)
-
-                for record in all_records:
-                    fields = record.get("fields", {})
-                    last_contacted_str = fields.get("Last Contacted")
-
-                    # Normalize field names for internal use (camelCase keys)
-                    lead = {
-                        "id": record["id"],
-                        "full_name": fields.get("Full Name", ""),
-                        "email": fields.get("Email Address", ""),
-                        "phone_number": fields.get("Phone Number", ""),
-                        "potential_interest": fields.get("Potential Interest", ""),
-                        "crm_services_needed": fields.get("CRM Services Needed", ""),
-                        "lead_source": fields.get("Lead Source", ""),
-                        "status_in_sales_funnel": fields.get("Status in Sales Funnel", ""),
-                        "last_contacted": fields.get("Last Contacted", ""),
-                        "generated_email_message": fields.get("Generated Text Message", ""),
-                        "timestamp": fields.get("Timestamp", ""),
-                        "status": fields.get("Status", "")
-                    }
+        if not fresh:
+            cached = self._cached_stale_leads(max_records)
+            if cached is not None:
+                return cached
 
-                    # Only include leads that have not been contacted in >7 days AND have no generated email
-                    if not lead.get("generated_email_message"):
-                        if not last_contacted_str:
-                            stale_leads.append(lead)
-                            continue
-                        try:
-                            if "/" in last_contacted_str:
-                                # Airtable is giving you DD/MM/YYYY
-                                last_contacted_date = datetime.strptime(last_contacted_str, "%d/%m/%Y").date()
-                            else:
-                                # Fallback to ISO YYYY-MM-DD
-                                last_contacted_date = datetime.strptime(last_contacted_str, "%Y-%m-%d").date()
-                            if today - last_contacted_date > stale_threshold:
-                                stale_leads.append(lead)
-                        except ValueError:
-                            logging.warning(f"Could not parse date '{last_contacted_str}' for record ID {record['id']}. Assuming stale.")
-                            stale_leads.append(lead)
+        # Concurrent callers share one Airtable scan instead of each starting their own
+        async with self._stale_lock:
+            if not fresh:
+                cached = self._cached_stale_leads(max_records)
+                if cached is not None:
+                    return cached
+            return await self._scan_stale_leads(max_records)
+
+    def _invalidate_stale_leads(self):
+        """Drop cached stale leads and mark any scan still in flight as outdated"""
+        self._write_generation += 1
+        self._stale_cache.clear()
+
+    def _invalidate_leads(self, lead_ids: List[str]):
+        """Drop cached copies of written leads along with the cached stale leads"""
+        for lead_id in lead_ids:
+            self._lead_cache.pop(lead_id, None)
+        self._invalidate_stale_leads()
+
+    def _cached_stale_leads(self, max_records: Optional[int]) -> Optional[List[Lead]]:
+        cached = self._stale_cache.get("stale")
+        if cached is None or max_records is None:
+            return cached
+        processable = 0
+        for index, lead in enumerate(cached):
+            if _is_processable(lead):
+                processable += 1
+                if processable >= max_records:
+                    return cached[:index + 1]
+        return cached
+
+    async def _scan_stale_leads(self, max_records: Optional[int]) -> List[Lead]:
+        """Page through Airtable and collect stale leads, refreshing the cache"""
+        try:
+            generation = self._write_generation
+            stale_leads = []
+            processable = 0
+            async with aclosing(self.iter_stale_leads()) as leads:
+                async for lead in leads:
+                    stale_leads.append(lead)
+                    if max_records and _is_processable(lead):
+                        processable += 1
+                        if processable >= max_records:
+                            break
                 
-                logging.info(f"Found {len(stale_leads)} stale leads")
-                return stale_leads
+            logging.info(f"Found {len(stale_leads)} stale leads")
+            # A capped result is not the full list, so only complete scans are cached,
+            # and only if no write happened while the pages were being read
+            if max_records is None and generation == self._write_generation:
+                self._stale_cache["stale"] = stale_leads
+            return stale_leads
                 
         except Exception as e:
             logging.error(f"Error fetching stale leads: {e}")
             return []
 
-    async def get_lead_by_id(self, lead_id: str) -> Optional[Dict]:
-        """Get a specific lead by ID from Airtable"""
+    async def iter_stale_leads(self) -> AsyncIterator[Lead]:
+        """
+        Yield stale leads as each Airtable page arrives, without caching or collecting them.
+        The next page is requested before the current one is filtered.
+        """
+        threshold_date = date.today() - timedelta(days=7)
+        params = {
+            "filterByFormula": STALE_LEADS_FORMULA,
+            "pageSize": 100,
+            "fields[]": _FIELD_COLUMNS
+        }
+        next_page = asyncio.create_task(self._request("GET", self._table_path, params=params))
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"https://api.airtable.com/v0/{self.base_id}/{self.table_name}/{lead_id}"
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
+            while next_page:
+                response = await next_page
+                data = orjson.loads(response.content)
                 
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
+                # Request the following page before filtering this one
+                offset = data.get("offset")
+                next_page = None
+                if offset:
+                    next_page = asyncio.create_task(
+                        self._request("GET", self._table_path, params={**params, "offset": offset})
+                    )
                 
-                record = response.json()
-                fields = record.get("fields", {})
+                for record in data.get("records", []):
+                    last_contacted_str = record.get("fields", {}).get("Last Contacted")
+
+                    # Only include leads that have not been contacted in >7 days;
+                    # Lead objects are built only for records that pass
+                    if last_contacted_str:
+                        try:
+                            if _parse_last_contacted(last_contacted_str) >= threshold_date:
+                                continue
+                        except ValueError:
+                            logging.warning(f"Could not parse date '{last_contacted_str}' for record ID {record['id']}. Assuming stale.")
+                    yield _lead_from_record(record)
+        finally:
+            if next_page:
+                next_page.cancel()
+
+    async def get_lead_by_id(self, lead_id: str) -> Optional[Lead]:
+        """Get a specific lead by ID from Airtable"""
+        if lead_id in self._lead_cache:
+            return self._lead_cache[lead_id]
+
+        try:
+            generation = self._write_generation
+            response = await self._request("GET", f"{self._table_path}/{lead_id}")
                 
-                # Normalize field names for internal use
-                lead = {
-                    "id": record["id"],
-                    "full_name": fields.get("Full Name", ""),
-                    "email": fields.get("Email Address", ""),
-                    "phone_number": fields.get("Phone Number", ""),
-                    "potential_interest": fields.get("Potential Interest", ""),
-                    "crm_services_needed": fields.get("CRM Services Needed", ""),
-                    "lead_source": fields.get("Lead Source", ""),
-                    "status_in_sales_funnel": fields.get("Status in Sales Funnel", ""),
-                    "last_contacted": fields.get("Last Contacted", ""),
-                    "generated_email_message": fields.get("Generated Text Message", ""),
-                    "timestamp": fields.get("Timestamp", ""),
-                    "status": fields.get("Status", "")
-                }
+            record = orjson.loads(response.content)
+            lead = _lead_from_record(record)
                 
-                return lead
+            # A write that landed while the GET was in flight may make this copy outdated
+            if generation == self._write_generation:
+                self._lead_cache[lead_id] = lead
+            return lead
                 
         except Exception as e:
             logging.error(f"Error fetching lead {lead_id}: {e}")
             return None
 
     async def update_lead_with_generated_email(self, lead_id: str, generated_email: str) -> bool:
-        """Update lead with generated text message, timestamp, and status"""
+        """
+        Update lead with generated text message, timestamp, and status.
+        Raises LeadNotFoundError if Airtable has no record with this ID.
+        """
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"https://api.airtable.com/v0/{self.base_id}/{self.table_name}/{lead_id}"
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                data = {
-                    "fields": {
-                        "Generated Text Message": generated_email,
-                        "Timestamp": datetime.now().isoformat(),
-                        "Status": "Email Generated"
-                    }
+            data = {
+                "fields": {
+                    "Generated Text Message": generated_email,
+                    "Timestamp": datetime.now().isoformat(),
+                    "Status": "Email Generated"
                 }
+            }
                 
-                response = await client.patch(url, headers=headers, json=data)
-                response.raise_for_status()
+            await self._request("PATCH", f"{self._table_path}/{lead_id}", content=orjson.dumps(data))
                 
-                logging.info(f"Successfully updated lead {lead_id} with generated email and status")
-                return True
+            logging.info(f"Successfully updated lead {lead_id} with generated email and status")
+            self._invalidate_leads([lead_id])
+            return True
                 
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise LeadNotFoundError(f"Lead {lead_id} not found") from e
+            logging.error(f"Error updating lead {lead_id}: {e}")
+            return False
         except Exception as e:
             logging.error(f"Error updating lead {lead_id}: {e}")
             return False
 
+    async def update_leads_bulk(self, updates: List[Tuple[str, str]]) -> Set[str]:
+        """
+        Update many leads with their generated emails, up to 10 records per PATCH.
+        Returns the IDs of the leads that were successfully updated.
+        """
+        updated_ids = set()
+        timestamp = datetime.now().isoformat()
+        
+        for start in range(0, len(updates), AIRTABLE_BATCH_SIZE):
+            chunk = updates[start:start + AIRTABLE_BATCH_SIZE]
+            data = {
+                "records": [
+                    {
+                        "id": lead_id,
+                        "fields": {
+                            "Generated Text Message": generated_email,
+                            "Timestamp": timestamp,
+                            "Status": "Email Generated"
+                        }
+                    }
+                    for lead_id, generated_email in chunk
+                ]
+            }
+            try:
+                await self._request("PATCH", self._table_path, content=orjson.dumps(data))
+            except Exception as e:
+                logging.error(f"Error updating leads {[lead_id for lead_id, _ in chunk]}: {e}")
+                continue
+            
+            # Invalidated per chunk so a lookup overlapping this write is not cached
+            chunk_ids = [lead_id for lead_id, _ in chunk]
+            updated_ids.update(chunk_ids)
+            self._invalidate_leads(chunk_ids)
+        
+        if updated_ids:
+            logging.info(f"Successfully updated {len(updated_ids)} leads with generated emails and status")
+        return updated_ids
+
+    async def _process_one(self, lead: Lead) -> Tuple[Dict, Optional[str]]:
+        """
+        Validate a single stale lead and generate its email.
+        Returns the result entry and the generated email, if one was produced.
+        """
+        try:
+            # Check if email is already generated for this lead
+            if lead.generated_email_message:
+                return {
+                    "lead_id": lead.id,
+                    "name": lead.full_name,
+                    "status": "already_processed",
+                    "message": "Email already generated"
+                }, None
+            
+            if not _is_processable(lead):
+                return {
+                    "lead_id": lead.id,
+                    "name": lead.full_name or 'Unknown',
+                    "status": "insufficient_data",
+                    "message": "Missing name or email"
+                }, None
+            
+            # Airtable writes are batched afterwards by the caller
+            generated_email = await self.email_generator.generate_re_engagement_email(lead)
+            
+            return {
+                "lead_id": lead.id,
+                "name": lead.full_name,
+                "status": "success",
+                "message": "Email generated and saved"
+            }, generated_email
+                
+        except Exception as e:
+            return {
+                "lead_id": lead.id,
+                "name": lead.full_name or 'Unknown',
+                "status": "error",
+                "message": f"Processing error: {str(e)}"
+            }, None
+
+    async def generate_and_save_emails(
+        self,
+        leads: List[Lead],
+        generate: Callable[[Lead], Awaitable[Tuple[Dict, Optional[str]]]]
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Run generate for every lead under the shared batch limit, then save the
+        generated emails in batched PATCH requests.
+        generate must not raise; it returns a result entry and the email, if any.
+        Returns all result entries in lead order, and the entries whose email
+        could not be saved so the caller can mark them in its own format.
+        """
+        # The semaphore is acquired before each task is spawned, so at most
+        # GEMINI_CONCURRENCY tasks exist at any time across all callers.
+        tasks = []
+        async with asyncio.TaskGroup() as tg:
+            for lead in leads:
+                await self._batch_sem.acquire()
+                task = tg.create_task(generate(lead))
+                task.add_done_callback(lambda _: self._batch_sem.release())
+                tasks.append(task)
+        
+        results = []
+        generated = []
+        pending = []
+        for lead, task in zip(leads, tasks):
+            result, generated_email = task.result()
+            if generated_email is not None:
+                pending.append((lead.id, generated_email))
+                generated.append(result)
+            results.append(result)
+        
+        updated_ids = await self.update_leads_bulk(pending)
+        unsaved = [result for (lead_id, _), result in zip(pending, generated) if lead_id not in updated_ids]
+        return results, unsaved
+
     async def process_all_stale_leads(self) -> Dict:
         """Main automation function: Process all stale leads and generate emails"""
         
         try:
-            stale_leads = await self.fetch_stale_leads()
+            stale_leads = await self.fetch_stale_leads(max_records=STALE_BATCH_SIZE)
             
             if not stale_leads:
                 return {
@@ -174,64 +455,11 @@ class AirtableUtils:
                     "results": []
                 }
             
-            # Correctly instantiate the GeminiEmailGenerator class
-            email_generator = GeminiEmailGenerator()
-            
-            results = []
-            success_count = 0
-            
-            for lead in stale_leads:
-                try:
-                    # Check if email is already generated for this lead
-                    if lead.get('generatedTextMessage'):
-                        results.append({
-                            "lead_id": lead['id'],
-                            "name": lead['fullName'],
-                            "status": "already_processed",
-                            "message": "Email already generated"
-                        })
-                        continue
-                    
-                    if not lead.get('fullName') or not lead.get('emailAddress'):
-                        results.append({
-                            "lead_id": lead['id'],
-                            "name": lead.get('fullName', 'Unknown'),
-                            "status": "insufficient_data",
-                            "message": "Missing name or email"
-                        })
-                        continue
-                    
-                    # Correctly use `await` because generate_re_engagement_email is an async function
-                    generated_email = await email_generator.generate_re_engagement_email(lead)
-                    
-                    update_success = await self.update_lead_with_generated_email(
-                        lead['id'], 
-                        generated_email
-                    )
-                    
-                    if update_success:
-                        success_count += 1
-                        results.append({
-                            "lead_id": lead['id'],
-                            "name": lead['fullName'],
-                            "status": "success",
-                            "message": "Email generated and saved"
-                        })
-                    else:
-                        results.append({
-                            "lead_id": lead['id'],
-                            "name": lead['fullName'],
-                            "status": "update_failed",
-                            "message": "Failed to update Airtable"
-                        })
-                        
-                except Exception as e:
-                    results.append({
-                        "lead_id": lead['id'],
-                        "name": lead.get('fullName', 'Unknown'),
-                        "status": "error",
-                        "message": f"Processing error: {str(e)}"
-                    })
+            results, unsaved = await self.generate_and_save_emails(stale_leads, self._process_one)
+            for result in unsaved:
+                result["status"] = "update_failed"
+                result["message"] = "Failed to update Airtable"
+            success_count = sum(1 for result in results if result["status"] == "success")
             
             return {
                 "success": True,
@@ -253,49 +481,42 @@ class AirtableUtils:
     async def create_new_lead(self, form_data) -> bool:
         """Create a new lead record in Airtable from form submission"""
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"https://api.airtable.com/v0/{self.base_id}/{self.table_name}"
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                # Map form fields to corrected Airtable fields
-                fields = {
-                    "Full Name": form_data.fullName,
-                    "Email Address": form_data.emailAddress,
-                    "Status in Sales Funnel": "New",
-                    "Last Contacted": datetime.now().strftime("%Y-%m-%d"),
-                }
+            # Map form fields to corrected Airtable fields
+            fields = {
+                "Full Name": form_data.fullName,
+                "Email Address": form_data.emailAddress,
+                "Status in Sales Funnel": "New",
+                "Last Contacted": datetime.now().strftime("%Y-%m-%d"),
+            }
                 
-                # Add optional fields if they exist in the form data
-                if form_data.phoneNumber:
-                    fields["Phone Number"] = form_data.phoneNumber
+            # Add optional fields if they exist in the form data
+            if form_data.phoneNumber:
+                fields["Phone Number"] = form_data.phoneNumber
                 
-                if form_data.potentialInterest:
-                    fields["Potential Interest"] = form_data.potentialInterest
+            if form_data.potentialInterest:
+                fields["Potential Interest"] = form_data.potentialInterest
                 
-                if form_data.crmServicesNeeded:
-                    fields["CRM Services Needed"] = form_data.crmServicesNeeded
+            if form_data.crmServicesNeeded:
+                fields["CRM Services Needed"] = form_data.crmServicesNeeded
                 
-                if form_data.leadSource:
-                    fields["Lead Source"] = form_data.leadSource
+            if form_data.leadSource:
+                fields["Lead Source"] = form_data.leadSource
 
-                data = {
-                    "records": [
-                        {
-                            "fields": fields
-                        }
-                    ]
-                }
+            data = {
+                "records": [
+                    {
+                        "fields": fields
+                    }
+                ]
+            }
                 
-                logging.info(f"Creating new lead with data: {fields}")
+            logging.info(f"Creating new lead with data: {fields}")
                 
-                response = await client.post(url, headers=headers, json=data)
-                response.raise_for_status()
+            await self._request("POST", self._table_path, content=orjson.dumps(data))
                 
-                logging.info("Successfully created lead in Airtable")
-                return True
+            logging.info("Successfully created lead in Airtable")
+            self._invalidate_stale_leads()
+            return True
                 
         except Exception as e:
             logging.error(f"Error creating new lead: {e}")
@@ -304,18 +525,20 @@ class AirtableUtils:
 # --- Example Usage (for demonstration) ---
 async def main():
     # Sample lead data
-    sample_lead = {
-        "fullName": "Jane Doe",
-        "emailAddress": "jane.doe@example.com",
-        "potentialInterest": "CRM integration with marketing automation",
-        "crmServicesNeeded": "a seamless data sync solution",
-        "leadSource": "a past webinar on sales efficiency",
-        "lastContacted": "2023-01-01"
-    }
+    sample_lead = Lead(
+        id="recSample",
+        full_name="Jane Doe",
+        email_address="jane.doe@example.com",
+        potential_interest="CRM integration with marketing automation",
+        crm_services_needed="a seamless data sync solution",
+        lead_source="a past webinar on sales efficiency",
+        last_contacted="2023-01-01"
+    )
+    
+    airtable_utils = AirtableUtils()
     
     # Example for GeminiEmailGenerator
-    email_generator = GeminiEmailGenerator()
-    generated_email = await email_generator.generate_re_engagement_email(sample_lead)
+    generated_email = await airtable_utils.email_generator.generate_re_engagement_email(sample_lead)
 
     if "Error" not in generated_email:
         print("Generated Email:")
@@ -325,11 +548,12 @@ async def main():
         print(generated_email)
     
     # Example for AirtableUtils
-    airtable_utils = AirtableUtils()
     processed_leads_result = await airtable_utils.process_all_stale_leads()
     print("\nProcessed Stale Leads:")
     print("-------------------------")
     print(processed_leads_result)
+    
+    await airtable_utils.aclose()
 
 # To run this code, you would use an event loop.
 # Example: asyncio.run(main())
\ No newline at end of file
@@ -1,14 +1,57 @@
-import json
 import logging
 import httpx
+import orjson
 import os
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from operator import attrgetter
+from typing import TYPE_CHECKING, Final, List, Dict, Optional
+from aiolimiter import AsyncLimiter
+from dotenv import load_dotenv
+from prompts import render_re_engagement_prompt
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+if TYPE_CHECKING:
+    from airtable_utils import Lead
 
 # Set up logging for better error visibility
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Load environment variables from .env file
+load_dotenv()
+
+# Gemini endpoint and limits; GEMINI_API_KEY is the default for new generators
+GEMINI_API_KEY: Final = os.getenv("GEMINI_API_KEY", "")
+GEMINI_API_URL: Final = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:streamGenerateContent"
+GEMINI_RPS: Final = int(os.getenv("GEMINI_RPS", "4"))
+# Upper bound on Gemini generations in flight across every caller
+GEMINI_CONCURRENCY: Final = int(os.getenv("GEMINI_CONCURRENCY", "5"))
+
+# Gemini responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Retry network failures and retryable HTTP status codes"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, httpx.TransportError)
+
+def _log_retry(retry_state: RetryCallState) -> None:
+    logging.warning(
+        f"API call failed (attempt {retry_state.attempt_number}): {retry_state.outcome.exception()}. "
+        f"Retrying in {retry_state.next_action.sleep:.1f} seconds..."
+    )
+
+# Fixed JSON around the prompt in a generateContent request body; only the
+# prompt string itself is serialized per call
+_PAYLOAD_PREFIX = b'{"contents":[{"role":"user","parts":[{"text":'
+_PAYLOAD_SUFFIX = b'}]}]}'
+
+# Lead attributes that must be non-empty before an email is generated;
+# fetched together by one attrgetter call per lead
+_REQUIRED_FIELDS = ("full_name", "email_address")
+_get_required_fields = attrgetter(*_REQUIRED_FIELDS)
+
 class GeminiEmailGenerator:
     """
     A class to generate personalized re-engagement emails using the Gemini API.
@@ -18,140 +61,121 @@ class GeminiEmailGenerator:
         Initializes the email generator with the Gemini API key.
         The API key is handled by the canvas environment.
         """
-        if not api_key:
-            api_key = os.getenv("GEMINI_API_KEY", "")
-        self.api_key = api_key
-        self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent"
+        self.api_key = api_key or GEMINI_API_KEY
+        self.api_url = GEMINI_API_URL
+        self._stream_url = f"{self.api_url}?alt=sse&key={self.api_key}"
+        # Reused across calls so retries and batches share warm connections;
+        # HTTP/2 multiplexes concurrent generations over a single connection
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=10)
+        )
+        # Token bucket that keeps outbound requests under Gemini's rate limit
+        self._limiter = AsyncLimiter(GEMINI_RPS, 1)
+        # Bounds in-flight generations for batch runs and single-lead jobs alike
+        self._concurrency = asyncio.Semaphore(GEMINI_CONCURRENCY)
+        # Retry policy built once; each call copies it with its own attempt limit
+        self._retrying = AsyncRetrying(
+            wait=wait_exponential_jitter(multiplier=1, max=30),
+            retry=retry_if_exception(_is_retryable),
+            before_sleep=_log_retry,
+            reraise=True
+        )
+
+    async def aclose(self):
+        """Close the shared HTTP client and release its pooled connections"""
+        await self._client.aclose()
         
-    def _create_personalized_prompt(self, lead: Dict) -> str:
+    def _create_personalized_prompt(self, lead: "Lead") -> str:
         """
         Creates a personalized prompt for the Gemini model based on the lead's data.
         
         Args:
-            lead (Dict): A dictionary containing lead information.
+            lead (Lead): The lead to write the email for.
         
         Returns:
             str: The formatted prompt string.
         """
-        # It's important to match the key names from the Airtable fetch function.
-        # The AirtableUtils class normalizes field names to camelCase, so we use those here.
-        full_name = lead.get("fullName", "Valued Customer")
-        email_address = lead.get("emailAddress", "")
-        potential_interest = lead.get("potentialInterest", "our services")
-        crm_services_needed = lead.get("crmServicesNeeded", "their CRM needs")
-        lead_source = lead.get("leadSource", "a previous conversation")
-        last_contacted = lead.get("lastContacted", "more than a week ago")
-        
-        prompt = f"""
-You are a professional sales representative writing a personalized re-engagement email to a lead who has gone stale.
-
-LEAD INFORMATION:
-- Name: {full_name}
-- Email: {email_address}
-- Potential Interest: {potential_interest}
-- CRM Services Needed: {crm_services_needed}
-- Lead Source: {lead_source}
-- Last Contacted: {last_contacted}
-- Status: Lead has been inactive for more than 7 days
-
-TASK: Write a compelling, personalized re-engagement email that:
-1. Acknowledges the time gap since last contact.
-2. References their specific interests and needs.
-3. Provides value or insight related to their CRM needs.
-4. Includes a clear, soft call-to-action.
-5. Maintains a professional but friendly tone.
-6. Keep it concise (under 200 words).
-
-FORMAT YOUR RESPONSE AS:
-Subject: [Compelling subject line]
-
-[Email body]
-
-Best regards,
-[Your Name]
-
-IMPORTANT: Make it personal and relevant to their specific situation. Avoid generic sales language.
-"""
-        return prompt.strip()
-
-    async def generate_re_engagement_email(self, lead: Dict) -> str:
+        # Empty Airtable cells come back as "", so fall back to generic wording.
+        return render_re_engagement_prompt({
+            "full_name": lead.full_name or "Valued Customer",
+            "email_address": lead.email_address,
+            "potential_interest": lead.potential_interest or "our services",
+            "crm_services_needed": lead.crm_services_needed or "their CRM needs",
+            "lead_source": lead.lead_source or "a previous conversation",
+            "last_contacted": lead.last_contacted or "more than a week ago",
+        })
+
+    async def generate_re_engagement_email(self, lead: "Lead") -> str:
         """
         Generates a personalized re-engagement email for a stale lead using the Gemini API.
 
         Args:
-            lead (Dict): A dictionary containing lead information.
+            lead (Lead): The lead to write the email for.
 
         Returns:
             str: The generated email content or an error message.
         """
         if not self.validate_lead_data(lead):
-            return "Error: Missing required lead data (fullName or emailAddress)."
+            return "Error: Missing required lead data (full_name or email_address)."
 
         try:
             prompt = self._create_personalized_prompt(lead)
-            
-            payload = {
-                "contents": [{"role": "user", "parts": [{"text": prompt}]}]
-            }
 
             # Make the API call with exponential backoff
-            response = await self._make_api_call(payload)
+            async with self._concurrency:
+                generated_email = await self._make_api_call(prompt)
             
-            if response and "candidates" in response and response["candidates"][0]["content"]["parts"][0]["text"]:
-                generated_email = response["candidates"][0]["content"]["parts"][0]["text"]
-                logging.info(f"Generated email for lead: {lead.get('fullName', 'Unknown')}")
+            if generated_email:
+                logging.info(f"Generated email for lead: {lead.full_name or 'Unknown'}")
                 return generated_email
             else:
-                logging.error(f"Gemini API response is empty or malformed: {response}")
+                logging.error("Gemini API response is empty or malformed")
                 return "Error: Gemini API returned an empty or invalid response."
         except Exception as e:
-            logging.error(f"Error generating email for lead {lead.get('fullName', 'Unknown')}: {e}")
+            logging.error(f"Error generating email for lead {lead.full_name or 'Unknown'}: {e}")
             return f"Error generating email: {str(e)}"
 
-    async def _make_api_call(self, payload: Dict, retries: int = 5, delay: int = 1):
+    async def _make_api_call(self, prompt: str, retries: int = 5) -> Optional[str]:
         """
-        Makes a fetch call to the Gemini API with exponential backoff using httpx.
-        The previous code used `js.fetch`, which is not valid Python.
+        Makes a streaming call to the Gemini API with jittered exponential backoff using httpx.
+        Text chunks are accumulated from the server-sent events as they arrive.
         """
-        api_url = f"{self.api_url}?key={self.api_key}"
-        for i in range(retries):
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        api_url,
-                        headers={'Content-Type': 'application/json'},
-                        json=payload,
-                        timeout=30
-                    )
+        body = _PAYLOAD_PREFIX + orjson.dumps(prompt) + _PAYLOAD_SUFFIX
+        async for attempt in self._retrying.copy(stop=stop_after_attempt(retries)):
+            with attempt:
+                # Every attempt draws from the shared rate budget, retries included
+                await self._limiter.acquire()
+                async with self._client.stream(
+                    "POST",
+                    self._stream_url,
+                    headers={'Content-Type': 'application/json'},
+                    content=body
+                ) as response:
                     response.raise_for_status()
-                    return response.json()
-            except httpx.HTTPStatusError as e:
-                # Handle rate limiting specifically
-                if e.response.status_code == 429 and i < retries - 1:
-                    logging.warning(f"Rate limit exceeded. Retrying in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    delay *= 2
-                else:
-                    logging.error(f"HTTP error during API call: {e}")
-                    raise
-            except httpx.RequestError as e:
-                logging.warning(f"API call failed (retry {i+1}/{retries}): {e}")
-                if i < retries - 1:
-                    await asyncio.sleep(delay)
-                    delay *= 2
-                else:
-                    raise
+                    parts = []
+                    async for line in response.aiter_lines():
+                        if line.startswith("data: "):
+                            parts.append(self._extract_text(orjson.loads(line[6:])))
+                    return "".join(parts)
         return None
 
-    def validate_lead_data(self, lead: Dict) -> bool:
+    @staticmethod
+    def _extract_text(chunk: Dict) -> str:
+        """Return the text carried by one streamed response chunk, if any"""
+        candidates = chunk.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    def validate_lead_data(self, lead: "Lead") -> bool:
         """
         Validate that required lead data is present for email generation.
-        We've updated the field names to match the camelCase keys from AirtableUtils.
         """
-        required_fields = ["fullName", "emailAddress"]
-        for field in required_fields:
-            if not lead.get(field):
-                logging.warning(f"Missing required field '{field}' for lead {lead.get('id', 'Unknown')}")
-                return False
-        return True
+        values = _get_required_fields(lead)
+        if all(values):
+            return True
+        missing = next(field for field, value in zip(_REQUIRED_FIELDS, values) if not value)
+        logging.warning(f"Missing required field '{missing}' for lead {lead.id}")
+        return False
 
@@ -1,16 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, root_validator
-from typing import List, Dict, Optional
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError, model_validator
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from operator import attrgetter
+from typing import AsyncIterator, Callable, List, Dict, Optional, Tuple
+from cachetools import TTLCache
+from contextlib import aclosing, asynccontextmanager
+import orjson
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 import logging
 
-from airtable_utils import AirtableUtils
-from email_generator import GeminiEmailGenerator
+from airtable_utils import AirtableUtils, Lead, LeadNotFoundError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,14 +25,42 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the pooled HTTP clients for the lifetime of the process"""
+    yield
+    await airtable_utils.aclose()
+
+class ErrorLoggingRoute(APIRoute):
+    """
+    Route that logs any error an endpoint does not handle itself and re-raises it as
+    HTTPException(500), so the response still passes through the CORS middleware.
+    """
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            try:
+                return await handler(request)
+            except (StarletteHTTPException, RequestValidationError):
+                raise
+            except Exception as exc:
+                logger.exception(f"Unhandled error in {request.method} {request.url.path}")
+                raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+        return route_handler
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AI-Powered Stale Lead Re-Engagement API",
     description="Backend API for AI-powered stale lead re-engagement with Airtable integration",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
+# Must be set before any route is declared
+app.router.route_class = ErrorLoggingRoute
 
 # Configure CORS
 app.add_middleware(
@@ -40,6 +74,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Export-Timestamp"],
 )
 
 # Create static directory if it doesn't exist
@@ -50,9 +85,17 @@ if not os.path.exists(static_dir):
 # Mount static files
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
+# The dashboard file is resolved once at startup; adding it later needs a restart
+_ADMIN_FILE = os.path.join(static_dir, "admin.html")
+_ADMIN_EXISTS = os.path.exists(_ADMIN_FILE)
+
 # Initialize utilities
 airtable_utils = AirtableUtils()
-email_generator = GeminiEmailGenerator()
+email_generator = airtable_utils.email_generator
+
+# Status of queued single-lead email jobs keyed by lead ID; in-process only,
+# so finished jobs expire after an hour and do not survive a restart
+_email_jobs = TTLCache(maxsize=1024, ttl=3600)
 
 # Pydantic models - Corrected to match form and Airtable field intentions
 class EmailUpdateRequest(BaseModel):
@@ -62,7 +105,7 @@ class EmailUpdateRequest(BaseModel):
 class FormSubmission(BaseModel):
     # Core required fields
     fullName: str
-    emailAddress: str = None  # Make optional for validation
+    emailAddress: Optional[str] = None  # Make optional for validation
     email: Optional[str] = None  # Accept 'email' as well
 
     # Optional fields based on your form and Airtable table
@@ -71,36 +114,47 @@ class FormSubmission(BaseModel):
     crmServicesNeeded: Optional[str] = None
     leadSource: Optional[str] = None
 
-    @root_validator(pre=True)
+    @model_validator(mode="before")
+    @classmethod
     def map_email_field(cls, values):
         # If 'email' is present but 'emailAddress' is not, map it
-        if not values.get('emailAddress') and values.get('email'):
-            values['emailAddress'] = values['email']
+        if isinstance(values, dict) and not values.get('emailAddress') and values.get('email'):
+            values = {**values, 'emailAddress': values['email']}
         return values
 
+def _json_response(payload, status_code: int = 200) -> Response:
+    """
+    Serialize an endpoint payload straight to JSON bytes with orjson.
+    Lead dataclasses are encoded natively, which skips FastAPI's jsonable_encoder walk.
+    """
+    return Response(orjson.dumps(payload), status_code=status_code, media_type="application/json")
+
 # ROOT ENDPOINTS
+# Static bodies serialized once; these endpoints are hit constantly by probes
+_ROOT_BODY = orjson.dumps({
+    "message": "AI-Powered Stale Lead Re-Engagement API is running!",
+    "docs": "/docs",
+    "redoc": "/redoc",
+    "admin": "/admin"
+})
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "stale-lead-re-engagement-api"})
+
 @app.get("/")
 async def root():
     """Root endpoint"""
-    return {
-        "message": "AI-Powered Stale Lead Re-Engagement API is running!",
-        "docs": "/docs",
-        "redoc": "/redoc",
-        "admin": "/admin"
-    }
+    return Response(_ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "stale-lead-re-engagement-api"}
+    return Response(_HEALTH_BODY, media_type="application/json")
 
 # ADMIN DASHBOARD STATIC FILE ENDPOINTS
 @app.get("/admin")
 async def serve_admin_dashboard():
     """Serve the admin dashboard HTML file"""
-    admin_file = os.path.join(static_dir, "admin.html")
-    if os.path.exists(admin_file):
-        return FileResponse(admin_file)
+    if _ADMIN_EXISTS:
+        return FileResponse(_ADMIN_FILE)
     else:
         raise HTTPException(
             status_code=404, 
@@ -115,295 +169,302 @@ async def admin_dashboard_redirect():
 # ===== CORE AUTOMATION ENDPOINTS =====
 
 @app.get("/stale-leads")
-async def get_stale_leads():
+async def get_stale_leads(fresh: bool = False):
     """Fetch stale leads where Last Contacted > 7 days"""
-    try:
-        leads = await airtable_utils.fetch_stale_leads()
-        return {
-            "leads": leads,
-            "total_count": len(leads)
-        }
-    except Exception as e:
-        logger.error(f"Error fetching stale leads: {e}")
-        raise HTTPException(status_code=500, detail=f"Error fetching stale leads: {str(e)}")
+    leads = await airtable_utils.fetch_stale_leads(fresh=fresh)
+    return _json_response({
+        "leads": leads,
+        "total_count": len(leads)
+    })
 
 @app.post("/process-stale-leads")
 async def process_stale_leads():
     """
     MAIN AUTOMATION ENDPOINT: Process all stale leads.
     """
-    try:
-        logger.info("Starting stale lead processing automation...")
-        result = await airtable_utils.process_all_stale_leads()
-        logger.info(f"Automation completed: {result['message']}")
-        return result
-        
-    except Exception as e:
-        logger.error(f"Error in process_stale_leads: {e}")
-        raise HTTPException(status_code=500, detail=f"Error processing stale leads: {str(e)}")
+    logger.info("Starting stale lead processing automation...")
+    result = await airtable_utils.process_all_stale_leads()
+    logger.info(f"Automation completed: {result['message']}")
+    return _json_response(result)
+
+def _dashboard_counts(leads: List[Lead]) -> Tuple[int, int, int]:
+    """Return (total, with generated email, pending) for the dashboard endpoints in one pass"""
+    total = len(leads)
+    generated = sum(1 for lead in leads if lead.generated_email_message)
+    return total, generated, total - generated
 
 @app.get("/dashboard-stats")
-async def get_dashboard_stats():
+async def get_dashboard_stats(fresh: bool = False):
     """Get statistics for the admin dashboard"""
-    try:
-        stale_leads = await airtable_utils.fetch_stale_leads()
-        total_stale = len(stale_leads)
-        emails_generated = len([lead for lead in stale_leads if lead.get('generated_text_message')])
-        pending_engagement = total_stale - emails_generated
-        
-        return {
-            "total_stale_leads": total_stale,
-            "emails_generated": emails_generated,
-            "pending_engagement": pending_engagement,
-            "stale_leads": stale_leads
-        }
-        
-    except Exception as e:
-        logger.error(f"Error fetching dashboard stats: {e}")
-        raise HTTPException(status_code=500, detail=f"Error fetching dashboard stats: {str(e)}")
+    stale_leads = await airtable_utils.fetch_stale_leads(fresh=fresh)
+    total_stale, emails_generated, pending_engagement = _dashboard_counts(stale_leads)
+
+    return _json_response({
+        "total_stale_leads": total_stale,
+        "emails_generated": emails_generated,
+        "pending_engagement": pending_engagement,
+        "stale_leads": stale_leads
+    })
 
 # ===== INDIVIDUAL LEAD OPERATIONS =====
 
 @app.get("/leads/{lead_id}")
 async def get_lead(lead_id: str):
     """Get a specific lead by ID from Airtable"""
+    lead = await airtable_utils.get_lead_by_id(lead_id)
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    return _json_response(lead)
+
+async def _run_email_job(lead: Lead, job: Dict):
+    """Background task: generate the email for a lead, save it and record the outcome in job"""
+    # job is passed in rather than looked up, so it survives cache eviction before the task runs
+    job["status"] = "running"
     try:
-        lead = await airtable_utils.get_lead_by_id(lead_id)
-        if not lead:
-            raise HTTPException(status_code=404, detail="Lead not found")
-        return lead
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error fetching lead {lead_id}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error fetching lead: {str(e)}")
-
-@app.post("/generate-email/{lead_id}")
-async def generate_email_for_lead(lead_id: str):
-    """Generate email for a specific lead and update Airtable"""
-    try:
-        lead = await airtable_utils.get_lead_by_id(lead_id)
-        if not lead:
-            raise HTTPException(status_code=404, detail="Lead not found")
-        
-        if not email_generator.validate_lead_data(lead):
-            raise HTTPException(status_code=400, detail="Insufficient lead data for email generation")
-        
-        generated_email = await email_generator.generate_re_engagement_email(lead)  # <-- FIXED
-        success = await airtable_utils.update_lead_with_generated_email(lead_id, generated_email)
-        
-        if success:
-            return {
-                "lead_id": lead_id,
-                "generated_email": generated_email,
-                "message": "Email generated and saved successfully",
-                "lead_info": lead
-            }
+        # Each step needs the previous one's result, so there is nothing to overlap here;
+        # the caller already got its 202 before generation started
+        generated_email = await email_generator.generate_re_engagement_email(lead)
+        if await airtable_utils.update_lead_with_generated_email(lead.id, generated_email):
+            job.update(status="completed", generated_email=generated_email)
         else:
-            raise HTTPException(status_code=500, detail="Failed to update Airtable")
-            
-    except HTTPException:
-        raise
+            job.update(status="failed", error="Failed to update Airtable with generated email")
     except Exception as e:
-        logger.error(f"Error generating email for lead {lead_id}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error generating email: {str(e)}")
+        logger.error(f"Error in email job for lead {lead.id}: {e}")
+        job.update(status="failed", error=str(e))
+
+async def _enqueue_email_job(lead_id: str, background_tasks: BackgroundTasks) -> Dict:
+    """
+    Validate the lead, then schedule generation after the response is sent.
+    A job already queued or running for the lead is returned instead of starting another.
+    """
+    lead = await airtable_utils.get_lead_by_id(lead_id)
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    
+    if not email_generator.validate_lead_data(lead):
+        raise HTTPException(status_code=400, detail="Insufficient lead data for email generation")
+    
+    # No await between this check and registering the job, so concurrent requests
+    # for the same lead cannot both start one
+    job = _email_jobs.get(lead_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        job = {"lead_id": lead_id, "status": "queued"}
+        _email_jobs[lead_id] = job
+        background_tasks.add_task(_run_email_job, lead, job)
+    return {"status": job["status"], "lead_id": lead_id, "job_url": f"/jobs/{lead_id}"}
+
+@app.post("/generate-email/{lead_id}", status_code=202)
+async def generate_email_for_lead(lead_id: str, background_tasks: BackgroundTasks):
+    """Queue email generation for a specific lead; poll /jobs/{lead_id} for the result"""
+    return _json_response(await _enqueue_email_job(lead_id, background_tasks), status_code=202)
 
 @app.post("/update-email/{lead_id}")
 async def update_email(lead_id: str, request: EmailUpdateRequest):
     """Update the Generated Text Message field in Airtable with the generated email"""
+    # Airtable answers a PATCH for a missing record with 404, so no lookup is needed first
     try:
-        lead = await airtable_utils.get_lead_by_id(lead_id)
-        if not lead:
-            raise HTTPException(status_code=404, detail="Lead not found")
-        
         success = await airtable_utils.update_lead_with_generated_email(lead_id, request.generated_text_message)
-        
-        if success:
-            return {
-                "message": "Email updated successfully in Airtable",
-                "lead_id": lead_id
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to update email in Airtable")
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error updating email: {str(e)}")
+    except LeadNotFoundError:
+        raise HTTPException(status_code=404, detail="Lead not found")
+
+    if success:
+        return _json_response({
+            "message": "Email updated successfully in Airtable",
+            "lead_id": lead_id
+        })
+    else:
+        raise HTTPException(status_code=500, detail="Failed to update email in Airtable")
 
-@app.post("/generate-and-update-email/{lead_id}")
-async def generate_and_update_email(lead_id: str):
-    """Generate a personalized re-engagement email and update Airtable with the result."""
-    try:
-        lead = await airtable_utils.get_lead_by_id(lead_id)
-        if not lead:
-            raise HTTPException(status_code=404, detail="Lead not found")
-        
-        if not email_generator.validate_lead_data(lead):
-            raise HTTPException(status_code=400, detail="Insufficient lead data for email generation")
-        
-        generated_email = await email_generator.generate_re_engagement_email(lead)  # <-- FIXED
-        update_success = await airtable_utils.update_lead_with_generated_email(lead_id, generated_email)
-        
-        if update_success:
-            return {
-                "lead_id": lead_id,
-                "generated_email": generated_email,
-                "lead_info": lead,
-                "message": "Email generated and Airtable updated successfully"
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to update Airtable with generated email")
-    except HTTPException:
-        raise
-    except Exception as e:
-        import logging
-        logging.error(f"Error in generate-and-update-email: {e}")
-        raise HTTPException(status_code=500, detail=f"Error in generate-and-update-email: {str(e)}")
+@app.post("/generate-and-update-email/{lead_id}", status_code=202)
+async def generate_and_update_email(lead_id: str, background_tasks: BackgroundTasks):
+    """Queue a personalized re-engagement email and Airtable update; poll /jobs/{lead_id} for the result."""
+    return _json_response(await _enqueue_email_job(lead_id, background_tasks), status_code=202)
+
+@app.get("/jobs/{lead_id}")
+async def get_email_job(lead_id: str):
+    """Get the status of the most recent email generation job for a lead"""
+    job = _email_jobs.get(lead_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No email job found for this lead")
+    return _json_response(job)
 
 # ===== FORM SUBMISSION =====
 
-@app.post("/submit-form")
-async def submit_form(form_data: FormSubmission):
+@app.post("/submit-form", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": FormSubmission.model_json_schema()}}
+    }
+})
+async def submit_form(request: Request):
     """Submit a new lead form to Airtable with comprehensive field mapping"""
+    # Parse and validate the raw body in one pass in pydantic-core instead of
+    # decoding to Python objects first and validating those
+    # Only JSON bodies are accepted; a text/plain or form POST is a CORS "simple" request
+    # that any site can send cross-origin without a preflight
+    media_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type != "application/json" and not media_type.endswith("+json"):
+        raise HTTPException(status_code=415, detail="Content-Type must be application/json")
     try:
-        import logging
-        logging.info(f"Received form submission: {form_data}")
-        
-        success = await airtable_utils.create_new_lead(form_data)
-        
-        if success:
-            return {
-                "message": "Form submitted successfully",
-                "status": "success",
-                "data": form_data.dict()
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to submit form to Airtable")
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        import logging
-        logging.error(f"Error in submit_form endpoint: {e}")
-        raise HTTPException(status_code=500, detail=f"Error submitting form: {str(e)}")
+        form_data = FormSubmission.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+    
+    logger.debug("Received form submission for %s", form_data.fullName)
+
+    success = await airtable_utils.create_new_lead(form_data)
+
+    if success:
+        return _json_response({
+            "message": "Form submitted successfully",
+            "status": "success",
+            "data": form_data.model_dump()
+        })
+    else:
+        raise HTTPException(status_code=500, detail="Failed to submit form to Airtable")
 
 # ===== DATA EXPORT =====
 
-@app.get("/export-leads")
-async def export_leads():
-    """Export all stale leads data for download"""
+# Export column name -> Lead attribute, resolved once instead of per lead
+_EXPORT_COLUMNS = tuple((key, attrgetter(attr)) for key, attr in (
+    ("ID", "id"),
+    ("Full Name", "full_name"),
+    ("Email", "email_address"),
+    ("Phone", "phone_number"),
+    ("Interest", "potential_interest"),
+    ("CRM Needs", "crm_services_needed"),
+    ("Source", "lead_source"),
+    ("Status", "status_in_sales_funnel"),
+    ("Last Contacted", "last_contacted"),
+))
+
+def _export_row(lead: Lead) -> Dict:
+    return {key: get(lead) for key, get in _EXPORT_COLUMNS} | {
+        "Email Generated": "Yes" if lead.generated_email_message else "No",
+        "Email Status": lead.status,
+        "Timestamp": lead.timestamp
+    }
+
+async def _stream_export_rows(leads: AsyncIterator[Lead], first: Optional[Lead]):
+    """
+    Yield one NDJSON line per stale lead as Airtable pages arrive, then a trailer line.
+    The trailer carries export_complete and total_records; a stream without a trailer,
+    or with export_complete false, is missing rows.
+    """
+    total = 0
     try:
-        leads = await airtable_utils.fetch_stale_leads()
-        
-        export_data = []
-        for lead in leads:
-            export_data.append({
-                "ID": lead.get("id", ""),
-                "Full Name": lead.get("fullName", ""),
-                "Email": lead.get("emailAddress", ""),
-                "Phone": lead.get("phoneNumber", ""),
-                "Interest": lead.get("potentialInterest", ""),
-                "CRM Needs": lead.get("crmServicesNeeded", ""),
-                "Source": lead.get("leadSource", ""),
-                "Status": lead.get("statusInSalesFunnel", ""),
-                "Last Contacted": lead.get("lastContacted", ""),
-                "Email Generated": "Yes" if lead.get("generatedTextMessage") else "No",
-                "Email Status": lead.get("status", ""),
-                "Timestamp": lead.get("timestamp", "")
-            })
-        
-        return {
-            "data": export_data,
-            "total_records": len(export_data),
-            "export_timestamp": datetime.now().isoformat()
-        }
-        
+        async with aclosing(leads):
+            if first is not None:
+                yield orjson.dumps(_export_row(first)) + b"\n"
+                total = 1
+                async for lead in leads:
+                    yield orjson.dumps(_export_row(lead)) + b"\n"
+                    total += 1
     except Exception as e:
+        # Headers are already sent, so the failure can only be reported in the body
         logger.error(f"Error exporting leads: {e}")
-        raise HTTPException(status_code=500, detail=f"Error exporting leads: {str(e)}")
+        yield orjson.dumps({"export_complete": False, "total_records": total, "error": str(e)}) + b"\n"
+        return
+    yield orjson.dumps({
+        "export_complete": True,
+        "total_records": total,
+        "export_timestamp": datetime.now().isoformat()
+    }) + b"\n"
+
+@app.get("/export-leads")
+async def export_leads():
+    """
+    Export all stale leads data for download as newline-delimited JSON.
+    Rows are read straight from Airtable and streamed, so the cache is not used.
+    """
+    # Read up to the first lead before responding so an unreachable Airtable is a 500
+    leads = airtable_utils.iter_stale_leads()
+    try:
+        first = await anext(leads, None)
+    except Exception:
+        await leads.aclose()
+        raise
+    return StreamingResponse(
+        _stream_export_rows(leads, first),
+        media_type="application/x-ndjson",
+        headers={"X-Export-Timestamp": datetime.now().isoformat()}
+    )
 
 # ADMIN API ENDPOINTS FOR DASHBOARD
 @app.get("/admin/dashboard")
-async def admin_dashboard_api():
+async def admin_dashboard_api(fresh: bool = False):
     """Admin dashboard API to view leads and automation status"""
+    stale_leads = await airtable_utils.fetch_stale_leads(fresh=fresh)
+    total_leads, leads_with_generated_emails, leads_pending_engagement = _dashboard_counts(stale_leads)
+
+    return _json_response({
+        "dashboard_stats": {
+            "total_stale_leads": total_leads,
+            "leads_with_generated_emails": leads_with_generated_emails,
+            "leads_pending_engagement": leads_pending_engagement
+        },
+        "stale_leads": stale_leads
+    })
+
+async def _generate_batch_email(lead: Lead) -> Tuple[Dict, Optional[str]]:
+    """Generate the email for one lead of a batch run; saving is batched by the caller"""
     try:
-        stale_leads = await airtable_utils.fetch_stale_leads()
-        total_leads = len(stale_leads)
-        leads_with_generated_emails = len([lead for lead in stale_leads if lead.get('generatedTextMessage')])
-        leads_pending_engagement = total_leads - leads_with_generated_emails
+        if not email_generator.validate_lead_data(lead):
+            return {
+                "lead_id": lead.id,
+                "lead_name": lead.full_name,
+                "status": "insufficient_data"
+            }, None
         
+        generated_email = await email_generator.generate_re_engagement_email(lead)
         return {
-            "dashboard_stats": {
-                "total_stale_leads": total_leads,
-                "leads_with_generated_emails": leads_with_generated_emails,
-                "leads_pending_engagement": leads_pending_engagement
-            },
-            "stale_leads": stale_leads
-        }
-        
+            "lead_id": lead.id,
+            "lead_name": lead.full_name,
+            "status": "success"
+        }, generated_email
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching dashboard data: {str(e)}")
+        return {
+            "lead_id": lead.id,
+            "lead_name": lead.full_name or 'Unknown',
+            "status": f"error: {str(e)}"
+        }, None
 
 @app.post("/admin/generate-batch-emails")
-async def generate_batch_emails():
+async def generate_batch_emails(fresh: bool = False):
     """Generate emails for all stale leads that don't have generated emails yet"""
-    try:
-        stale_leads = await airtable_utils.fetch_stale_leads()
-        leads_to_process = [lead for lead in stale_leads if not lead.get('generatedTextMessage')]
-        
-        results = []
-        success_count = 0
-        
-        for lead in leads_to_process:
-            try:
-                if email_generator.validate_lead_data(lead):
-                    generated_email = await email_generator.generate_re_engagement_email(lead)  # <-- FIXED
-                    email_success = await airtable_utils.update_lead_with_generated_email(lead['id'], generated_email)
-                    
-                    if email_success:
-                        success_count += 1
-                        results.append({
-                            "lead_id": lead['id'],
-                            "lead_name": lead['fullName'],
-                            "status": "success"
-                        })
-                    else:
-                        results.append({
-                            "lead_id": lead['id'],
-                            "lead_name": lead['fullName'],
-                            "status": "failed_to_update_airtable"
-                        })
-                else:
-                    results.append({
-                        "lead_id": lead['id'],
-                        "lead_name": lead['fullName'],
-                        "status": "insufficient_data"
-                    })
-            except Exception as e:
-                results.append({
-                    "lead_id": lead['id'],
-                    "lead_name": lead.get('fullName', 'Unknown'),
-                    "status": f"error: {str(e)}"
-                })
-        
-        return {
-            "message": f"Batch email generation completed. {success_count}/{len(leads_to_process)} successful.",
-            "total_processed": len(leads_to_process),
-            "successful": success_count,
-            "results": results
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error in batch email generation: {str(e)}")
+    stale_leads = await airtable_utils.fetch_stale_leads(fresh=fresh)
+    leads_to_process = [lead for lead in stale_leads if not lead.generated_email_message]
+
+    # Shares the automation run's batch limit; Gemini calls are also bounded by the generator
+    results, unsaved = await airtable_utils.generate_and_save_emails(leads_to_process, _generate_batch_email)
+    for result in unsaved:
+        result["status"] = "failed_to_update_airtable"
+    success_count = sum(1 for result in results if result["status"] == "success")
+
+    return _json_response({
+        "message": f"Batch email generation completed. {success_count}/{len(leads_to_process)} successful.",
+        "total_processed": len(leads_to_process),
+        "successful": success_count,
+        "results": results
+    })
 
 # SERVER STARTUP
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
+    # The file watcher is for local development only; uvicorn ignores workers when reloading
+    reload = os.getenv("ENV", "dev") != "production"
+    # Job status and lead caches live in process memory, so extra workers are opt-in
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True
+        reload=reload,
+        workers=workers,
+        # Resolve to uvloop and httptools, installed with uvicorn[standard]
+        loop="auto",
+        http="auto"
     )
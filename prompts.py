@@ -1,3 +1,5 @@
+import re
+
 # Email prompt template for the Gemini API
 EMAIL_PROMPT = """
 You are an expert sales representative specializing in B2B solutions. Your task is to write a short, personalized follow-up email to a lead who has gone "stale" (i.e., has not responded). The goal is to re-engage the lead and encourage a response, while showing empathy and respect for their time.
@@ -32,3 +34,46 @@ Hi [Lead Name],
 Best,
 [Your Name]
 """
+
+# Prompt template for re-engagement emails sent by GeminiEmailGenerator
+RE_ENGAGEMENT_PROMPT = """
+You are a professional sales representative writing a personalized re-engagement email to a lead who has gone stale.
+
+LEAD INFORMATION:
+- Name: {full_name}
+- Email: {email_address}
+- Potential Interest: {potential_interest}
+- CRM Services Needed: {crm_services_needed}
+- Lead Source: {lead_source}
+- Last Contacted: {last_contacted}
+- Status: Lead has been inactive for more than 7 days
+
+TASK: Write a compelling, personalized re-engagement email that:
+1. Acknowledges the time gap since last contact.
+2. References their specific interests and needs.
+3. Provides value or insight related to their CRM needs.
+4. Includes a clear, soft call-to-action.
+5. Maintains a professional but friendly tone.
+6. Keep it concise (under 200 words).
+
+FORMAT YOUR RESPONSE AS:
+Subject: [Compelling subject line]
+
+[Email body]
+
+Best regards,
+[Your Name]
+
+IMPORTANT: Make it personal and relevant to their specific situation. Avoid generic sales language.
+""".strip()
+
+# Split once at import into alternating literal / field-name chunks so
+# rendering is a single join instead of re-parsing the template per lead
+_RE_ENGAGEMENT_PARTS = re.split(r"\{(\w+)\}", RE_ENGAGEMENT_PROMPT)
+
+def render_re_engagement_prompt(fields: dict) -> str:
+    """Fill RE_ENGAGEMENT_PROMPT with the given field values; missing fields render empty."""
+    return "".join(
+        part if i % 2 == 0 else str(fields.get(part, ""))
+        for i, part in enumerate(_RE_ENGAGEMENT_PARTS)
+    )